@@ -58,14 +58,14 @@ which can be viewed in the source code.
 """
 
 
-# numpy (and scipy) don't yet have type annotations
+# numpy doesn't yet have type annotations
 import numpy as np # type: ignore
-from scipy.special import comb # type: ignore
+from numpy.lib.stride_tricks import as_strided # type: ignore
 import itertools as it
-import numbers
 import re
-from typing import List, Callable, Union, Collection, Tuple, Any, Type, Deque
-from typing import DefaultDict, TypeVar, Counter, Dict, Iterable, Generator, Sequence
+from functools import lru_cache
+from typing import List, Callable, Union, Collection, Tuple, Any
+from typing import DefaultDict, TypeVar, Counter, Dict, Iterable, Generator, Sequence, Optional
 
 
 Cell_coord = Tuple[int, ...]
@@ -75,17 +75,22 @@ Line_np = TypeVar('Line_np', np.ndarray, np.ndarray) # Line_np should really be
 Line_coord = List[Cell_coord]
 
 Lines_np = List[Line_np]
+Lines_array_np = np.ndarray # Lines_array_np should really be a 2d numpy array with a row of n elements for each line
 Lines_enum_np = Dict[int, Line_np]
 Lines_coord = List[Line_coord]
 Lines_enum_coord = Dict[int, Line_coord]
+Lines_array_coord = np.ndarray # Lines_array_coord should really be a 3d numpy array of shape (number of lines, n, d)
 
 Scopes_np = DefaultDict[Cell_coord, Lines_np]  
 Scopes_coord = DefaultDict[Cell_coord, Lines_coord]
 Scopes_enum = DefaultDict[Cell_coord, List[int]]  
 Scopes = Union[Scopes_np, Scopes_coord, Scopes_enum]
+Scopes_array_np = Tuple[np.ndarray, np.ndarray] # Scopes_array_np should really be a 2d numpy array of line indices and a 1d numpy array of scope sizes
+Scopes_csr_np = Tuple[np.ndarray, np.ndarray] # Scopes_csr_np should really be a 1d numpy array of offsets and a 1d numpy array of line indices
 
 Structure_np = Tuple[Cube_np, Lines_np, Scopes_np]
 Structure_enum_np = Tuple[Cube_np, Lines_enum_np, Scopes_enum]
+Structure_array_np = Tuple[Cube_np, Lines_array_np, Scopes_array_np]
 Structure_coord = Tuple[Lines_coord, Scopes_coord]
 Structure_enum_coord = Tuple[Lines_enum_coord, Scopes_enum]
 
@@ -166,8 +171,11 @@ def num_lines_grouped(d: int, n: int) -> Generator[int, None, None]:
     [48, 24, 4]
     """
 
+    # dCi is built up from dC(i-1), which is exact in integers
+    c = 1
     for i in range(1, d + 1):
-        yield comb(d, i, True) * (n ** (d - i)) * (2 ** (i - 1))
+        c = c * (d - i + 1) // i
+        yield c * (n ** (d - i)) * (2 ** (i - 1))
 
 
 def num_lines(d: int, n: int) -> int: 
@@ -219,7 +227,7 @@ def num_lines(d: int, n: int) -> int:
     """
     
     # return sum(list(num_lines_grouped(d, n)))
-    return int(((n+2)**d-n**d)/2)
+    return ((n+2)**d-n**d)//2
 
 
 def get_diagonals_np(hc: Cube_np) -> Generator[Line_np, None, None]:
@@ -238,6 +246,11 @@ def get_diagonals_np(hc: Cube_np) -> Generator[Line_np, None, None]:
 
         numpy.ndarray views of the d-gonals of `hc`.
 
+    Raises
+    ------
+    ValueError
+        If `hc` is not the same length in every dimension
+
     Notes
     -----
     The number of corners of `hc` is 2^d. The number of d-agonals 
@@ -262,7 +275,8 @@ def get_diagonals_np(hc: Cube_np) -> Generator[Line_np, None, None]:
     [array([99,  7]), array([1, 6]), array([4, 3]), array([5, 2])]
     """
     
-    # The function is recursive. How it works is best shown by example.
+    # The order of the d-agonals is that of a recursive definition, which
+    # is best shown by example.
     # 1d: hc = [0, 1] then the diagonal is also [0, 1].
     
     # 2d: hc = [[0, 1],
@@ -299,11 +313,114 @@ def get_diagonals_np(hc: Cube_np) -> Generator[Line_np, None, None]:
     # The diagonals of this array are [4, 3] and [2, 5]
     # We now have all four 3-agonals of the original 3-cube hc.
 
-    if hc.ndim == 1:
-        yield hc
-    else:
-        yield from get_diagonals_np(hc.diagonal())
-        yield from get_diagonals_np(np.flip(hc, 0).diagonal())
+    # Rather than recursing, _diagonal_reversed_axes gives, for each
+    # d-agonal in this order, the axes along which it runs backwards.
+    # Each d-agonal is then a strided view starting from the 
+    # corresponding corner of hc.
+
+    n = _cube_side(hc)
+    for reversed_axes in _diagonal_reversed_axes(hc.ndim):
+        corner = hc[tuple(slice(None, None, -1) if r else slice(None) for r in reversed_axes)]
+        yield as_strided(corner, shape = (n,), strides = (sum(corner.strides),))
+
+
+def _cube_side(hc: Cube_np) -> int:
+    """ 
+    _cube_side(hc: Cube_np) -> int
+
+    The number of cells in any dimension of `hc`. The strided views of
+    the d-agonals assume this is the same in every dimension, so any
+    other shape is rejected rather than read past the end of `hc`.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> _cube_side(np.zeros((3, 3)))
+    3
+    >>> _cube_side(np.zeros((3, 2)))
+    Traceback (most recent call last):
+    ...
+    ValueError: hc must have the same length in every dimension
+    """
+
+    n = hc.shape[0]
+    if hc.shape != (n,) * hc.ndim:
+        raise ValueError("hc must have the same length in every dimension")
+    return n
+
+
+@lru_cache(maxsize = 32)
+def _diagonal_reversed_axes(d: int) -> Tuple[Tuple[bool, ...], ...]:
+    """ 
+    _diagonal_reversed_axes(d: int) -> Tuple[Tuple[bool, ...], ...]
+
+    For each d-agonal of a d-cube, in the order given by 
+    get_diagonals_np, the axes along which the d-agonal runs backwards.
+
+    Notes
+    -----
+    This follows the recursive definition described in
+    get_diagonals_np, using an explicit stack. Rather than arrays, it
+    tracks for each axis of an intermediate array the original axes it
+    runs along, and whether each of these is reversed. Taking the
+    diagonal merges the first two axes into a new last axis; flipping
+    reverses the original axes of the first axis.
+
+    Examples
+    --------
+    >>> _diagonal_reversed_axes(2)
+    ((False, False), (True, False))
+    """
+
+    reversed_axes = []
+    stack = [[[(axis, False)] for axis in range(d)]]
+    while stack:
+        axes = stack.pop()
+        if len(axes) == 1:
+            reversed_axes.append(tuple(r for _, r in sorted(axes[0])))
+        else:
+            main = axes[2:] + [axes[0] + axes[1]]
+            flipped = axes[2:] + [[(axis, not r) for axis, r in axes[0]] + axes[1]]
+            # push the flipped diagonals first so the main ones are taken first
+            stack.append(flipped)
+            stack.append(main)
+
+    return tuple(reversed_axes)
+
+
+@lru_cache(maxsize = 128)
+def _combinations(d: int, r: int) -> Tuple[Tuple[Tuple[int, ...], Tuple[int, ...]], ...]:
+    """ 
+    _combinations(d: int, r: int) -> 
+        Tuple[Tuple[Tuple[int, ...], Tuple[int, ...]], ...]
+
+    The combinations of `r` of the dimensions 0,...,d-1, each paired 
+    with the remaining dimensions.
+
+    Examples
+    --------
+    >>> _combinations(3, 2)
+    (((0, 1), (2,)), ((0, 2), (1,)), ((1, 2), (0,)))
+    """
+
+    return tuple((comb, tuple(j for j in range(d) if j not in comb)) 
+                 for comb in it.combinations(range(d), r = r))
+
+
+@lru_cache(maxsize = 32)
+def _cells(n: int, k: int) -> Tuple[Cell_coord, ...]:
+    """ 
+    _cells(n: int, k: int) -> Tuple[Cell_coord, ...]
+
+    The cells of h(k, n), in the order of itertools.product.
+
+    Examples
+    --------
+    >>> _cells(2, 2)
+    ((0, 0), (0, 1), (1, 0), (1, 1))
+    """
+
+    return tuple(it.product(range(n), repeat = k))
 
 
 def get_lines_grouped_np(hc: Cube_np) -> Generator[Lines_np, None, None]: 
@@ -371,7 +488,12 @@ def get_lines_i_np(hc: Cube_np, i: int) -> Generator[Lines_np, None, None]:
 
         numpy.ndarray views of the lines in `hc` that span 
         `i` dimensions.
-            
+
+    Raises
+    ------
+    ValueError
+        If `hc` is not the same length in every dimension
+
     See Also
     --------
     num_lines_grouped
@@ -402,22 +524,56 @@ def get_lines_i_np(hc: Cube_np, i: int) -> Generator[Lines_np, None, None]:
     """
  
     d = hc.ndim
-    n = hc.shape[0]
+    n = _cube_side(hc)
     lines = []
 
     # loop over all possible combinations of i dimensions
-    for i_comb in it.combinations(range(d), r = i + 1): 
-        # a cell could be in any position in the other dimensions
-        other_d = set(range(d)) - set(i_comb)
-        for cell in it.product(range(n), repeat = d - i - 1):
-            # take a slice of selected i dimensions given a cell
-            sl = slice_ndarray(hc, other_d, cell)
+    # a cell could be in any position in the other dimensions
+    for i_comb, other_d in _combinations(d, i + 1): 
+        diags = _slice_diagonals_np(hc, other_d)
+        for cell in _cells(n, d - i - 1):
             # get all possible lines from slice
-            lines.extend(list(get_diagonals_np(sl)))
+            lines.extend([diag[cell] for diag in diags])
 
     yield lines
 
 
+def _slice_diagonals_np(hc: Cube_np, other_d: Tuple[int, ...]) -> List[Cube_np]:
+    """ 
+    _slice_diagonals_np(hc: Cube_np, other_d: Tuple[int, ...]) -> 
+        List[Cube_np]
+
+    The diagonals of every slice of `hc` across the dimensions not in
+    `other_d`, in the order of get_diagonals_np. Each is a view whose
+    leading dimensions are `other_d` and whose last dimension runs along
+    the diagonal, so that indexing it by the coordinates in `other_d`
+    gives the diagonal of the slice at those coordinates.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> hc = np.arange(8).reshape(2, 2, 2)
+    >>> _slice_diagonals_np(hc, (0,))
+    [array([[0, 3],
+           [4, 7]]), array([[2, 1],
+           [6, 5]])]
+    """
+
+    # hc has already been checked by _cube_side in the public callers
+    d = hc.ndim
+    n = hc.shape[0]
+    k = len(other_d)
+    # move the other dimensions to the front, so that indexing by a
+    # cell gives the slice of the remaining dimensions at that cell
+    arr = np.moveaxis(hc, other_d, range(k))
+    diags = []
+    for reversed_axes in _diagonal_reversed_axes(d - k):
+        corner = arr[(Ellipsis,) + tuple(slice(None, None, -1) if r else slice(None) for r in reversed_axes)]
+        diags.append(as_strided(corner, shape = corner.shape[:k] + (n,), 
+                                strides = corner.strides[:k] + (sum(corner.strides[k:]),)))
+    return diags
+
+
 def get_lines_np(hc: Cube_np) -> Generator[Line_np, None, None]: 
     """ 
     get_lines_np(hc: Cube_np) -> Generator[Line_np, None, None]:
@@ -459,8 +615,76 @@ def get_lines_np(hc: Cube_np) -> Generator[Line_np, None, None]:
     """
 
     grouped = get_lines_grouped_np(hc)
-    flat = (x for y in grouped for x in y)
-    yield from flat # return flat works as well but yield from this is explicit as to being a generator
+    yield from it.chain.from_iterable(grouped)
+
+
+def get_lines_array_np(hc: Cube_np) -> Lines_array_np:
+    """ 
+    get_lines_array_np(hc: Cube_np) -> Lines_array_np:
+    
+    Returns the lines in a hypercube as a single 2-d array
+
+    Parameters
+    ----------
+    hc
+        The hypercube whose lines are to be calculated
+
+    Returns
+    -------
+
+        A numpy.ndarray of shape (number of lines, n) whose rows are 
+        the values of the lines in `hc`, in the same order as 
+        get_lines_np.
+
+    Raises
+    ------
+    ValueError
+        If `hc` is not the same length in every dimension
+
+    See Also
+    --------
+    get_lines_np
+
+    Notes
+    -----
+    The rows are copies, not views, of the lines in `hc`. If `hc` is
+    populated with the values 0,1,2,...,n^d - 1 then each row holds the
+    flat indices of the cells in a line, and all the lines of any
+    array of the same shape can be gathered in one operation.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> hc = np.arange(4).reshape(2, 2)
+    >>> hc
+    array([[0, 1],
+           [2, 3]])
+    >>> lines = get_lines_array_np(hc)
+    >>> lines
+    array([[0, 2],
+           [1, 3],
+           [0, 1],
+           [2, 3],
+           [0, 3],
+           [2, 1]])
+    >>> board = np.array([[5, 6], [7, 8]])
+    >>> board.ravel()[lines[4]]
+    array([5, 8])
+    """
+
+    d = hc.ndim
+    n = _cube_side(hc)
+    blocks = []
+    # for each combination of dimensions, copy each diagonal of all the 
+    # slices in one go into a block ordered as in get_lines_i_np
+    for i in range(d):
+        for i_comb, other_d in _combinations(d, i + 1):
+            diags = _slice_diagonals_np(hc, other_d)
+            block = np.empty((n ** (d - i - 1), len(diags), n), dtype = hc.dtype)
+            for j, diag in enumerate(diags):
+                block[:, j] = diag.reshape(-1, n)
+            blocks.append(block.reshape(-1, n))
+    return np.concatenate(blocks)
 
 
 def get_scopes_np(lines: Lines_np, d: int) -> Scopes_np:
@@ -480,75 +704,503 @@ def get_scopes_np(lines: Lines_np, d: int) -> Scopes_np:
         The dimension of the hypercube that was used to
         generate `lines`.
 
-    Returns
-    -------
+    Returns
+    -------
+
+        A dictionary with keys equal to the coordinates of each cell in
+        the hypercube. For each cell key, the value is the cell's
+        scope - a list of numpy.ndarray views that are lines containing
+        the cell.
+
+    Raises
+    ------
+    ValueError
+        If a value in `lines` is not a flat index of a cell, from 0 to
+        n^d - 1
+
+    See Also
+    --------
+    get_lines_np
+
+    Notes
+    -----
+    The lines parameter must be generated from an array populated 
+    with values 0,1,2,..., so that the value in each cell of a line is
+    its flat index. The coordinates of the cell with flat index k are
+    looked up as _cells(n, d)[k], so each cell's coordinates are a 
+    single shared tuple. The values are first checked by 
+    _check_flat_indices, which raises ValueError for any out of range.
+ 
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pprint import pprint
+    >>> hc = np.arange(4).reshape(2, 2)
+    >>> hc
+    array([[0, 1],
+           [2, 3]])
+    >>> lines = list(get_lines_np(hc))
+    >>> lines #doctest: +NORMALIZE_WHITESPACE
+    [array([0, 2]), array([1, 3]), array([0, 1]), array([2, 3]),
+     array([0, 3]), array([2, 1])]
+    
+    >>> scopes = get_scopes_np(lines, 2)
+    >>> pprint(scopes) #doctest: +SKIP
+    defaultdict(<class 'list'>,
+                {(0, 0): [array([0, 2]), array([0, 1]), array([0, 3])],
+                 (0, 1): [array([1, 3]), array([0, 1]), array([2, 1])],
+                 (1, 0): [array([0, 2]), array([2, 3]), array([2, 1])],
+                 (1, 1): [array([1, 3]), array([2, 3]), array([0, 3])]})
+    
+    >>> sorted(scopes.items()) #doctest: +NORMALIZE_WHITESPACE
+    [((0, 0), [array([0, 2]), array([0, 1]), array([0, 3])]),
+     ((0, 1), [array([1, 3]), array([0, 1]), array([2, 1])]),
+     ((1, 0), [array([0, 2]), array([2, 3]), array([2, 1])]),
+     ((1, 1), [array([1, 3]), array([2, 3]), array([0, 3])])]
+    
+    >>> hc[0, 0] = 99
+    >>> pprint(scopes) #doctest: +SKIP
+    defaultdict(<class 'list'>,
+        {(0, 0): [array([99,  2]), array([99,  1]), array([99,  3])],
+         (0, 1): [array([1, 3]), array([99,  1]), array([2, 1])],
+         (1, 0): [array([99,  2]), array([2, 3]), array([2, 1])],
+         (1, 1): [array([1, 3]), array([2, 3]), array([99,  3])]})
+
+    >>> sorted(scopes.items()) #doctest: +NORMALIZE_WHITESPACE
+    [((0, 0), [array([99,  2]), array([99,  1]), array([99,  3])]),
+     ((0, 1), [array([1, 3]), array([99,  1]), array([2, 1])]),
+     ((1, 0), [array([99,  2]), array([2, 3]), array([2, 1])]),
+     ((1, 1), [array([1, 3]), array([2, 3]), array([99,  3])])]
+    """
+    
+    n = lines[0].size
+    shape = [n] * d
+    scopes: Scopes_np = DefaultDict(list)
+
+    for line, cells in zip(lines, _line_cells(lines, shape)):
+        for cell in cells:
+            scopes[cell].append(line) 
+    return scopes
+
+
+def get_scopes_array_np(lines: Lines_array_np, d: int) -> Scopes_array_np:
+    """ 
+    get_scopes_array_np(lines: Lines_array_np, d: int) -> Scopes_array_np:
+
+    Calculate the scope of each cell in a hypercube as arrays of line
+    indices
+
+    Parameters
+    ----------
+    lines
+        The returned value from get_lines_array_np(hc) where hc is of 
+        the form np.arange(n ** d, dtype = intx__).reshape([n] * d).
+        That is, hc is populated with the values 0,1,2,...,n^d - 1.
+
+    dim
+        The dimension of the hypercube that was used to
+        generate `lines`.
+
+    Returns
+    -------
+
+        A tuple (scope_idx, scope_len). scope_idx is a numpy.ndarray of
+        shape (n^d, largest scope size). Row k holds the indices of the
+        rows of `lines` that contain the cell with flat index k, padded
+        with -1. scope_len is a numpy.ndarray with the scope size of 
+        each cell.
+            
+    See Also
+    --------
+    get_lines_array_np
+    get_scopes_np
+
+    Notes
+    -----
+    The line indices of a cell are in increasing order, as are the 
+    lines in a scope from get_scopes_np. The lines containing the cell 
+    with coordinates `cell` are then
+    lines[scope_idx[k, :scope_len[k]]] with 
+    k = np.ravel_multi_index(cell, [n] * d).
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> hc = np.arange(4).reshape(2, 2)
+    >>> lines = get_lines_array_np(hc)
+    >>> scope_idx, scope_len = get_scopes_array_np(lines, 2)
+    >>> scope_idx
+    array([[0, 2, 4],
+           [1, 2, 5],
+           [0, 3, 5],
+           [1, 3, 4]], dtype=int32)
+    >>> scope_len
+    array([3, 3, 3, 3], dtype=int32)
+    >>> lines[scope_idx[1, :scope_len[1]]]
+    array([[1, 3],
+           [0, 1],
+           [2, 1]])
+    """
+
+    n = lines.shape[1]
+    indptr, line_ids = get_scopes_csr_np(lines, d)
+    scope_len = np.diff(indptr)
+    # the cell of each entry of line_ids, and its position in the scope
+    cells = np.repeat(np.arange(n ** d), scope_len)
+    pos = np.arange(line_ids.size) - indptr[cells]
+
+    scope_idx = np.full((n ** d, scope_len.max(initial = 0)), -1, dtype = line_ids.dtype)
+    scope_idx[cells, pos] = line_ids
+    return scope_idx, scope_len
+
+
+def get_scopes_csr_np(lines: Lines_array_np, d: int) -> Scopes_csr_np:
+    """ 
+    get_scopes_csr_np(lines: Lines_array_np, d: int) -> Scopes_csr_np:
+
+    Calculate the scope of each cell in a hypercube in compressed
+    sparse row form
+
+    Parameters
+    ----------
+    lines
+        The returned value from get_lines_array_np(hc) where hc is of 
+        the form np.arange(n ** d, dtype = intx__).reshape([n] * d).
+        That is, hc is populated with the values 0,1,2,...,n^d - 1.
+
+    dim
+        The dimension of the hypercube that was used to
+        generate `lines`.
+
+    Returns
+    -------
+
+        A tuple (indptr, line_ids) of numpy.ndarrays of np.int32, or of
+        np.int64 if `lines` has more entries than np.int32 can count. 
+        The indices of the rows of `lines` that contain the cell with 
+        flat index k are line_ids[indptr[k]:indptr[k + 1]].
+            
+    See Also
+    --------
+    get_lines_array_np
+    get_scopes_array_np
+    get_scope_cell_csr_np
+
+    Notes
+    -----
+    Each line index is stored once for each cell of the line, with no
+    padding. The line indices of a cell are in increasing order.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> lines = get_lines_array_np(np.arange(4).reshape(2, 2))
+    >>> indptr, line_ids = get_scopes_csr_np(lines, 2)
+    >>> indptr
+    array([ 0,  3,  6,  9, 12], dtype=int32)
+    >>> line_ids
+    array([0, 2, 4, 1, 2, 5, 0, 3, 5, 1, 3, 4], dtype=int32)
+    """
+
+    n = lines.shape[1]
+    cells = lines.ravel()
+    # group the entries by cell, keeping line indices in increasing order;
+    # the line of an entry is its position in cells divided by n
+    order = np.argsort(cells, kind = 'stable')
+    # indptr counts up to the number of entries, which must not overflow
+    dtype = np.int32 if cells.size <= np.iinfo(np.int32).max else np.int64
+    line_ids = (order // n).astype(dtype)
+    indptr = np.zeros(n ** d + 1, dtype = dtype)
+    np.cumsum(np.bincount(cells, minlength = n ** d), out = indptr[1:])
+    return indptr, line_ids
+
+
+def get_scope_cell_csr_np(lines: Lines_array_np, scopes: Scopes_csr_np, cell: Cell_coord) -> Lines_array_np:
+    """ 
+    get_scope_cell_csr_np(lines: Lines_array_np, scopes: Scopes_csr_np, 
+                          cell: Cell_coord) -> Lines_array_np:
+
+    Return the lines in the scope of a cell
+
+    Parameters
+    ----------
+    lines
+        The returned value from get_lines_array_np
+    scopes
+        The returned value from get_scopes_csr_np(lines, d)
+    cell
+        The coordinates of the cell
+
+    Returns
+    -------
+
+        The rows of `lines` that contain `cell`.
+
+    Raises
+    ------
+    ValueError
+        If `cell` is not a cell of the hypercube
+            
+    See Also
+    --------
+    get_scopes_csr_np
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> lines = get_lines_array_np(np.arange(4).reshape(2, 2))
+    >>> scopes = get_scopes_csr_np(lines, 2)
+    >>> get_scope_cell_csr_np(lines, scopes, (0, 1))
+    array([[1, 3],
+           [0, 1],
+           [2, 1]])
+    >>> get_scope_cell_csr_np(lines, scopes, (0, 2))
+    Traceback (most recent call last):
+    ...
+    ValueError: invalid entry in coordinates array
+    >>> get_scope_cell_csr_np(lines, scopes, (0, 0, 0))
+    Traceback (most recent call last):
+    ...
+    ValueError: cell does not have the dimension of the hypercube
+    """
+
+    indptr, line_ids = scopes
+    n = lines.shape[1]
+    # indptr has one more entry than the n^d cells
+    if len(cell) == 0 or n ** len(cell) != len(indptr) - 1:
+        raise ValueError("cell does not have the dimension of the hypercube")
+    # the flat index of the cell; raises ValueError if cell is off the board
+    k = int(np.ravel_multi_index(cell, [n] * len(cell)))
+    return lines[line_ids[indptr[k]:indptr[k + 1]]]
+
+
+def scopes_size_cell_array_np(lines: Lines_array_np, d: int) -> DefaultDict[int, List[Cell_coord]]:
+    """
+    scopes_size_cell_array_np(lines: Lines_array_np, d: int) ->
+        DefaultDict[int, List[Cell_coord]]:
+
+    Group cells by length of their scope, without building the scopes.
+
+    Parameters
+    ----------
+    lines
+        The returned value from get_lines_array_np(hc) where hc is of
+        the form np.arange(n ** d, dtype = intx__).reshape([n] * d).
+        That is, hc is populated with the values 0,1,2,...,n^d - 1.
+
+    dim
+        The dimension of the hypercube that was used to
+        generate `lines`.
+
+    Returns
+    -------
+
+        Dictonary of scopes lengths (key) and the list of cells with
+        scopes of that length. Cells are listed in increasing order.
+
+    See Also
+    --------
+    scopes_size_cell
+    get_lines_array_np
+
+    Notes
+    -----
+    The length of the scope of a cell is the number of times its flat
+    index appears in `lines`, so it is counted in a single pass over
+    `lines`.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> lines = get_lines_array_np(np.arange(9).reshape(3, 3))
+    >>> sorted(scopes_size_cell_array_np(lines, 2).items()) #doctest: +NORMALIZE_WHITESPACE
+    [(2, [(0, 1), (1, 0), (1, 2), (2, 1)]),
+     (3, [(0, 0), (0, 2), (2, 0), (2, 2)]),
+     (4, [(1, 1)])]
+    """
+
+    n = lines.shape[1]
+    cells = _cells(n, d)
+    counts = np.bincount(lines.ravel(), minlength = n ** d)
+    scopes_size_cell: DefaultDict[int, List[Cell_coord]] = DefaultDict(list)
+    for size in np.unique(counts).tolist():
+        scopes_size_cell[size] = [cells[k] for k in np.flatnonzero(counts == size).tolist()]
+
+    return scopes_size_cell
+
+
+def check_win(board: Cube_np, lines: Lines_array_np, player: Any) -> bool:
+    """ 
+    check_win(board: Cube_np, lines: Lines_array_np, player: Any) -> bool:
+
+    Determine whether a player occupies every cell of some line
+
+    Parameters
+    ----------
+    board
+        A hypercube holding the state of each cell
+    lines
+        The returned value from get_lines_array_np(hc) where hc is of 
+        the form np.arange(n ** d, dtype = intx__).reshape([n] * d),
+        with the same shape as `board`.
+    player
+        The value marking the cells occupied by the player
+
+    Returns
+    -------
+
+        True if all the cells of any line in `board` equal `player`.
+            
+    See Also
+    --------
+    get_lines_array_np
+
+    Notes
+    -----
+    All lines are gathered from `board` and compared in one vectorized
+    operation. For a board with a small integer dtype, such as np.int8,
+    this moves less memory.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> lines = get_lines_array_np(np.arange(9).reshape(3, 3))
+    >>> board = np.array([[1, 2, 0], 
+    ...                   [2, 1, 0], 
+    ...                   [0, 0, 1]], dtype = np.int8)
+    >>> check_win(board, lines, 1)
+    True
+    >>> check_win(board, lines, 2)
+    False
+    """
+
+    return bool(np.any(np.all(board.take(lines) == player, axis = 1)))
+
+
+def _line_cells(lines: Lines_np, shape: List[int]) -> Generator[Tuple[Cell_coord, ...], None, None]:
+    """ 
+    _line_cells(lines: Lines_np, shape: List[int]) -> 
+        Generator[Tuple[Cell_coord, ...], None, None]
+
+    The coordinates of the cells of each line in `lines`, whose values
+    are flat indices into an array of shape `shape`.
+
+    Notes
+    -----
+    The cell with flat index k is _cells(n, d)[k], so the coordinates
+    of each cell are a single shared tuple, looked up rather than 
+    unravelled. The lines are concatenated _LINE_CELLS_TILE at a time,
+    which keeps the flat indices of only a few lines in memory at once.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> list(_line_cells([np.array([0, 3]), np.array([2, 1])], [2, 2]))
+    [((0, 0), (1, 1)), ((1, 0), (0, 1))]
+    """
+
+    all_cells = _cells(shape[0], len(shape))
+    for t in range(0, len(lines), _LINE_CELLS_TILE):
+        tile = lines[t:t + _LINE_CELLS_TILE]
+        n = tile[0].size
+        flat = np.concatenate(tile)
+        _check_flat_indices(flat, len(all_cells))
+        cells = list(map(all_cells.__getitem__, flat.tolist()))
+        for k in range(len(tile)):
+            yield tuple(cells[k * n:(k + 1) * n])
+
+
+_LINE_CELLS_TILE = 1024
+
+
+def _check_flat_indices(flat: Cube_np, size: int) -> None:
+    """ 
+    _check_flat_indices(flat: Cube_np, size: int) -> None
+
+    Raise ValueError unless every value in `flat` is a flat index into
+    an array of `size` cells. Cells are looked up by flat index in a 
+    tuple, which would otherwise wrap negative values round to the end
+    of the hypercube.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> _check_flat_indices(np.array([0, 3]), 4)
+    >>> _check_flat_indices(np.array([-1, 3]), 4)
+    Traceback (most recent call last):
+    ...
+    ValueError: lines must hold flat indices from 0 to 3
+    """
+
+    if flat.size and (flat.min() < 0 or flat.max() >= size):
+        raise ValueError(f"lines must hold flat indices from 0 to {size - 1}")
+
+
+def _cube_dtype(d: int, n: int, OFFSET: int = 0) -> type:
+    """ 
+    _cube_dtype(d: int, n: int, OFFSET: int = 0) -> type
+
+    The smallest signed integer dtype that holds n^d + OFFSET.
+
+    Notes
+    -----
+    The structure functions first populate the hypercube with the 
+    values 0,1,2,...,n^d - 1 and the caller may go on to store values
+    up to n^d + OFFSET in it, so the dtype must hold both. A smaller 
+    dtype means less memory to move when the hypercube is traversed.
+
+    Examples
+    --------
+    >>> _cube_dtype(2, 3)
+    <class 'numpy.int8'>
+    >>> _cube_dtype(3, 3, 101)
+    <class 'numpy.int16'>
+    >>> _cube_dtype(2, 2 ** 16)
+    <class 'numpy.int64'>
+    """
+
+    for dtype in (np.int8, np.int16, np.int32):
+        if n ** d + OFFSET <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
 
-        A dictionary with keys equal to the coordinates of each cell in
-        the hypercube. For each cell key, the value is the cell's
-        scope - a list of numpy.ndarray views that are lines containing
-        the cell.
-            
-    See Also
-    --------
-    get_lines_np
+
+@lru_cache(maxsize = 8)
+def _structure_template(d: int, n: int) -> Tuple[Tuple[slice, ...], Tuple[Tuple[Cell_coord, Tuple[int, ...]], ...]]:
+    """ 
+    _structure_template(d: int, n: int) -> 
+        Tuple[Tuple[slice, ...], Tuple[Tuple[Cell_coord, Tuple[int, ...]], ...]]
+
+    The lines and scopes of a hypercube as index data, independent of
+    the values in the hypercube.
 
     Notes
     -----
-    The implementation of this function uses np.unravel_index, and
-    relies uopn the lines parameter being generated from an array
-    populated with values 0,1,2,...
- 
+    The cells of every line have flat indices in arithmetic 
+    progression, so each line is a basic slice of the flattened 
+    hypercube. The scopes are the line indices of each cell, with the
+    cells in the order that get_scopes_np first sees them.
+
     Examples
     --------
-    >>> import numpy as np
-    >>> from pprint import pprint
-    >>> hc = np.arange(4).reshape(2, 2)
-    >>> hc
-    array([[0, 1],
-           [2, 3]])
-    >>> lines = list(get_lines_np(hc))
-    >>> lines #doctest: +NORMALIZE_WHITESPACE
-    [array([0, 2]), array([1, 3]), array([0, 1]), array([2, 3]),
-     array([0, 3]), array([2, 1])]
-    
-    >>> scopes = get_scopes_np(lines, 2)
-    >>> pprint(scopes) #doctest: +SKIP
-    defaultdict(<class 'list'>,
-                {(0, 0): [array([0, 2]), array([0, 1]), array([0, 3])],
-                 (0, 1): [array([1, 3]), array([0, 1]), array([2, 1])],
-                 (1, 0): [array([0, 2]), array([2, 3]), array([2, 1])],
-                 (1, 1): [array([1, 3]), array([2, 3]), array([0, 3])]})
-    
-    >>> sorted(scopes.items()) #doctest: +NORMALIZE_WHITESPACE
-    [((0, 0), [array([0, 2]), array([0, 1]), array([0, 3])]),
-     ((0, 1), [array([1, 3]), array([0, 1]), array([2, 1])]),
-     ((1, 0), [array([0, 2]), array([2, 3]), array([2, 1])]),
-     ((1, 1), [array([1, 3]), array([2, 3]), array([0, 3])])]
-    
-    >>> hc[0, 0] = 99
-    >>> pprint(scopes) #doctest: +SKIP
-    defaultdict(<class 'list'>,
-        {(0, 0): [array([99,  2]), array([99,  1]), array([99,  3])],
-         (0, 1): [array([1, 3]), array([99,  1]), array([2, 1])],
-         (1, 0): [array([99,  2]), array([2, 3]), array([2, 1])],
-         (1, 1): [array([1, 3]), array([2, 3]), array([99,  3])]})
-
-    >>> sorted(scopes.items()) #doctest: +NORMALIZE_WHITESPACE
-    [((0, 0), [array([99,  2]), array([99,  1]), array([99,  3])]),
-     ((0, 1), [array([1, 3]), array([99,  1]), array([2, 1])]),
-     ((1, 0), [array([99,  2]), array([2, 3]), array([2, 1])]),
-     ((1, 1), [array([1, 3]), array([2, 3]), array([99,  3])])]
+    >>> slices, scopes = _structure_template(2, 2)
+    >>> slices #doctest: +NORMALIZE_WHITESPACE
+    (slice(0, 3, 2), slice(1, 4, 2), slice(0, 2, 1), slice(2, 4, 1),
+     slice(0, 4, 3), slice(2, 0, -1))
+    >>> scopes
+    (((0, 0), (0, 2, 4)), ((1, 0), (0, 3, 5)), ((0, 1), (1, 2, 5)), ((1, 1), (1, 3, 4)))
     """
-    
-    n = lines[0].size
-    shape = [n] * d
-    scopes: Scopes_np = DefaultDict(list)
 
-    for line in lines:
-        for j in range(n):
-            cell = np.unravel_index(line[j], shape)
-            scopes[cell].append(line) 
-    return scopes
+    hc = np.arange(n ** d).reshape([n] * d)
+    lines = get_lines_enum_np(hc)
+    slices = []
+    for line in lines.values():
+        start = int(line[0])
+        step = int(line[1] - line[0]) if n > 1 else 1
+        stop = start + step * (n - 1) + (1 if step > 0 else -1)
+        slices.append(slice(start, stop if stop >= 0 else None, step))
+    scopes = get_scopes_enum_np(lines, d)
+    return tuple(slices), tuple((cell, tuple(ids)) for cell, ids in scopes.items())
 
 
 def structure_np(d: int, n: int, zeros: bool = True, OFFSET: int = 0) -> Structure_np:
@@ -567,9 +1219,10 @@ def structure_np(d: int, n: int, zeros: bool = True, OFFSET: int = 0) -> Structu
     zeros
         If true, all values in array are 0, else they are 0,1,2,...
     OFFSET
-        The number of cells is n^d. If this greater than 
-        (2^31 - OFFSET - 1) then we use np.int64 (instead of np.int32)
-        as the dtype of the numpy array.
+        The number of cells is n^d. The dtype of the numpy array is the
+        smallest of np.int8, np.int16, np.int32 and np.int64 that holds
+        n^d + OFFSET. Any value later put into the array must fit in 
+        this dtype, e.g. np.int8 holds only -128 to 127.
  
     Returns
     -------
@@ -589,55 +1242,123 @@ def structure_np(d: int, n: int, zeros: bool = True, OFFSET: int = 0) -> Structu
     >>> struct = structure_np(2, 2) 
     >>> struct[0]
     array([[0, 0],
-           [0, 0]])
+           [0, 0]], dtype=int8)
     
     >>> struct[1] #doctest: +NORMALIZE_WHITESPACE
-    [array([0, 0]), array([0, 0]), array([0, 0]), array([0, 0]),
-     array([0, 0]), array([0, 0])]
+    [array([0, 0], dtype=int8), array([0, 0], dtype=int8), array([0, 0], dtype=int8), array([0, 0], dtype=int8),
+     array([0, 0], dtype=int8), array([0, 0], dtype=int8)]
     
     >>> pprint(struct[2]) #doctest: +SKIP
     defaultdict(<class 'list'>,
-                {(0, 0): [array([0, 0]), array([0, 0]), array([0, 0])],
-                 (0, 1): [array([0, 0]), array([0, 0]), array([0, 0])],
-                 (1, 0): [array([0, 0]), array([0, 0]), array([0, 0])],
-                 (1, 1): [array([0, 0]), array([0, 0]), array([0, 0])]})
+                {(0, 0): [array([0, 0], dtype=int8), array([0, 0], dtype=int8), array([0, 0], dtype=int8)],
+                 (0, 1): [array([0, 0], dtype=int8), array([0, 0], dtype=int8), array([0, 0], dtype=int8)],
+                 (1, 0): [array([0, 0], dtype=int8), array([0, 0], dtype=int8), array([0, 0], dtype=int8)],
+                 (1, 1): [array([0, 0], dtype=int8), array([0, 0], dtype=int8), array([0, 0], dtype=int8)]})
     
     >>> sorted(struct[2].items()) #doctest: +NORMALIZE_WHITESPACE
-    [((0, 0), [array([0, 0]), array([0, 0]), array([0, 0])]),
-     ((0, 1), [array([0, 0]), array([0, 0]), array([0, 0])]),
-     ((1, 0), [array([0, 0]), array([0, 0]), array([0, 0])]),
-     ((1, 1), [array([0, 0]), array([0, 0]), array([0, 0])])]
+    [((0, 0), [array([0, 0], dtype=int8), array([0, 0], dtype=int8), array([0, 0], dtype=int8)]),
+     ((0, 1), [array([0, 0], dtype=int8), array([0, 0], dtype=int8), array([0, 0], dtype=int8)]),
+     ((1, 0), [array([0, 0], dtype=int8), array([0, 0], dtype=int8), array([0, 0], dtype=int8)]),
+     ((1, 1), [array([0, 0], dtype=int8), array([0, 0], dtype=int8), array([0, 0], dtype=int8)])]
     
     >>> struct = structure_np(2, 2, False) 
     >>> struct[0]
     array([[0, 1],
-           [2, 3]])
+           [2, 3]], dtype=int8)
     
     >>> struct[1] #doctest: +NORMALIZE_WHITESPACE
-    [array([0, 2]), array([1, 3]), array([0, 1]), array([2, 3]),
-     array([0, 3]), array([2, 1])]
+    [array([0, 2], dtype=int8), array([1, 3], dtype=int8), array([0, 1], dtype=int8), array([2, 3], dtype=int8),
+     array([0, 3], dtype=int8), array([2, 1], dtype=int8)]
     
     >>> pprint(struct[2]) #doctest: +SKIP
     defaultdict(<class 'list'>,
-                {(0, 0): [array([0, 2]), array([0, 1]), array([0, 3])],
-                 (0, 1): [array([1, 3]), array([0, 1]), array([2, 1])],
-                 (1, 0): [array([0, 2]), array([2, 3]), array([2, 1])],
-                 (1, 1): [array([1, 3]), array([2, 3]), array([0, 3])]})
+                {(0, 0): [array([0, 2], dtype=int8), array([0, 1], dtype=int8), array([0, 3], dtype=int8)],
+                 (0, 1): [array([1, 3], dtype=int8), array([0, 1], dtype=int8), array([2, 1], dtype=int8)],
+                 (1, 0): [array([0, 2], dtype=int8), array([2, 3], dtype=int8), array([2, 1], dtype=int8)],
+                 (1, 1): [array([1, 3], dtype=int8), array([2, 3], dtype=int8), array([0, 3], dtype=int8)]})
 
     >>> sorted(struct[2].items()) #doctest: +NORMALIZE_WHITESPACE
-    [((0, 0), [array([0, 2]), array([0, 1]), array([0, 3])]),
-     ((0, 1), [array([1, 3]), array([0, 1]), array([2, 1])]),
-     ((1, 0), [array([0, 2]), array([2, 3]), array([2, 1])]),
-     ((1, 1), [array([1, 3]), array([2, 3]), array([0, 3])])]             
+    [((0, 0), [array([0, 2], dtype=int8), array([0, 1], dtype=int8), array([0, 3], dtype=int8)]),
+     ((0, 1), [array([1, 3], dtype=int8), array([0, 1], dtype=int8), array([2, 1], dtype=int8)]),
+     ((1, 0), [array([0, 2], dtype=int8), array([2, 3], dtype=int8), array([2, 1], dtype=int8)]),
+     ((1, 1), [array([1, 3], dtype=int8), array([2, 3], dtype=int8), array([0, 3], dtype=int8)])]             
+    """
+
+    # the lines and scopes depend only on d and n, so are built once from
+    # a cached template and bound to a new hypercube on each call
+    slices, template = _structure_template(d, n)
+    dtype = _cube_dtype(d, n, OFFSET)
+    hc = np.zeros([n] * d, dtype = dtype) if zeros else np.arange(n ** d, dtype = dtype).reshape([n] * d)
+    flat = hc.reshape(-1)
+    lines = [flat[s] for s in slices]
+    scopes: Scopes_np = DefaultDict(list)
+    for cell, ids in template:
+        scopes[cell] = [lines[idx] for idx in ids]
+    return (hc, lines, scopes)
+
+
+def structure_array_np(d: int, n: int, zeros: bool = True, OFFSET: int = 0) -> Structure_array_np:
+    """ 
+    structure_array_np(d: int, n: int, zeros: bool = True, OFFSET: int = 0) -> 
+        Structure_array_np:
+    
+    Return a hypercube, its lines as a single array, and the scopes of
+    its cells as arrays of line indices.
+
+    Parameters
+    ----------
+    d
+        The number of dimensions of the hypercube
+    n
+        The number of cells in any dimension
+    zeros
+        If true, all values in array are 0, else they are 0,1,2,...
+    OFFSET
+        The number of cells is n^d. The dtype of the numpy array is the
+        smallest of np.int8, np.int16, np.int32 and np.int64 that holds
+        n^d + OFFSET. Any value later put into the array must fit in 
+        this dtype, e.g. np.int8 holds only -128 to 127.
+ 
+    Returns
+    -------
+
+        The hypercube (as a numpy array), the flat indices of the cells
+        of each line, and the scopes of its cells.
+            
+    See Also
+    --------
+    structure_np
+    get_lines_array_np
+    get_scopes_array_np
+
+    Notes
+    -----
+    Unlike structure_np, no list of views or dictionary of scopes is
+    built. The lines of any array of the same shape as the hypercube 
+    are gathered with hc.ravel()[lines], and the lines containing the
+    cell with flat index k are lines[scope_idx[k, :scope_len[k]]].
+ 
+    Examples
+    --------
+    >>> hc, lines, (scope_idx, scope_len) = structure_array_np(2, 2)
+    >>> hc
+    array([[0, 0],
+           [0, 0]], dtype=int8)
+    >>> lines
+    array([[0, 2],
+           [1, 3],
+           [0, 1],
+           [2, 3],
+           [0, 3],
+           [2, 1]], dtype=int8)
+    >>> scope_idx[0, :scope_len[0]]
+    array([0, 2, 4], dtype=int32)
     """
 
-    # number of cells is n^d. If this greater than (2^31 - OFFSET - 1)
-    # then we use int64. This is because the get_scopes 
-    # function populates the arrays with values 0,1,2, ...
-    dtype = np.int64 if n ** d > 2 ** 31 - OFFSET - 1 else np.int32
+    dtype = _cube_dtype(d, n, OFFSET)
     hc = np.arange(n ** d, dtype = dtype).reshape([n] * d)
-    lines = list(get_lines_np(hc))
-    scopes = get_scopes_np(lines, d)
+    lines = get_lines_array_np(hc)
+    scopes = get_scopes_array_np(lines, d)
     if zeros:
         hc.fill(0)
     return (hc, lines, scopes)
@@ -752,9 +1473,8 @@ def get_scopes_enum_np(lines: Lines_enum_np, d: int) -> Scopes_enum:
     shape = [n] * d
     scopes: Scopes_enum = DefaultDict(list)
 
-    for idx, line in lines.items():
-        for j in range(n):
-            cell = np.unravel_index(line[j], shape)
+    for idx, cells in zip(lines, _line_cells(list(lines.values()), shape)):
+        for cell in cells:
             scopes[cell].append(idx) 
     return scopes
 
@@ -776,10 +1496,11 @@ def structure_enum_np(d: int, n: int, zeros: bool = True, OFFSET: int = 0) -> St
         The number of cells in any dimension
     zeros
         If true, all values in array are 0, else they are 0,1,2,...
-    base: int
-        Tne number of cells is n^d. If this greater than 
-        (2^31 - OFFSET - 1) then we use np.int64 (instead of np.int32)
-        as the dtype of the numpy array.
+    OFFSET
+        The number of cells is n^d. The dtype of the numpy array is the
+        smallest of np.int8, np.int16, np.int32 and np.int64 that holds
+        n^d + OFFSET. Any value later put into the array must fit in 
+        this dtype, e.g. np.int8 holds only -128 to 127.
  
     Returns
     -------
@@ -799,15 +1520,15 @@ def structure_enum_np(d: int, n: int, zeros: bool = True, OFFSET: int = 0) -> St
     >>> struct = structure_enum_np(2, 2) 
     >>> struct[0]
     array([[0, 0],
-           [0, 0]])
+           [0, 0]], dtype=int8)
     
     >>> pprint(struct[1]) #doctest: +SKIP
-    {0: array([0, 0]), 1: array([0, 0]), 2: array([0, 0]),
-     3: array([0, 0]), 4: array([0, 0]), 5: array([0, 0])}
+    {0: array([0, 0], dtype=int8), 1: array([0, 0], dtype=int8), 2: array([0, 0], dtype=int8),
+     3: array([0, 0], dtype=int8), 4: array([0, 0], dtype=int8), 5: array([0, 0], dtype=int8)}
     
     >>> sorted(struct[1].items()) #doctest: +NORMALIZE_WHITESPACE
-    [(0, array([0, 0])), (1, array([0, 0])), (2, array([0, 0])),
-     (3, array([0, 0])), (4, array([0, 0])), (5, array([0, 0]))]
+    [(0, array([0, 0], dtype=int8)), (1, array([0, 0], dtype=int8)), (2, array([0, 0], dtype=int8)),
+     (3, array([0, 0], dtype=int8)), (4, array([0, 0], dtype=int8)), (5, array([0, 0], dtype=int8))]
 
     >>> pprint(struct[2]) #doctest: +SKIP
     defaultdict(<class 'list'>,
@@ -823,15 +1544,15 @@ def structure_enum_np(d: int, n: int, zeros: bool = True, OFFSET: int = 0) -> St
     >>> struct = structure_enum_np(2, 2, False) 
     >>> struct[0]
     array([[0, 1],
-           [2, 3]])
+           [2, 3]], dtype=int8)
     
     >>> pprint(struct[1]) #doctest: +SKIP
-    {0: array([0, 2]), 1: array([1, 3]), 2: array([0, 1]),
-     3: array([2, 3]), 4: array([0, 3]), 5: array([2, 1])}
+    {0: array([0, 2], dtype=int8), 1: array([1, 3], dtype=int8), 2: array([0, 1], dtype=int8),
+     3: array([2, 3], dtype=int8), 4: array([0, 3], dtype=int8), 5: array([2, 1], dtype=int8)}
     
     >>> sorted(struct[1].items()) #doctest: +NORMALIZE_WHITESPACE
-    [(0, array([0, 2])), (1, array([1, 3])), (2, array([0, 1])),
-     (3, array([2, 3])), (4, array([0, 3])), (5, array([2, 1]))]
+    [(0, array([0, 2], dtype=int8)), (1, array([1, 3], dtype=int8)), (2, array([0, 1], dtype=int8)),
+     (3, array([2, 3], dtype=int8)), (4, array([0, 3], dtype=int8)), (5, array([2, 1], dtype=int8))]
 
     >>> pprint(struct[2]) #doctest: +SKIP
     defaultdict(<class 'list'>,
@@ -845,15 +1566,14 @@ def structure_enum_np(d: int, n: int, zeros: bool = True, OFFSET: int = 0) -> St
      ((1, 0), [0, 3, 5]), ((1, 1), [1, 3, 4])]        
     """
 
-    # number of cells is n^d. If this greater than (2^31 - OFFSET - 1)
-    # then we use int64. This is because the the get_scopes 
-    # function populates the arrays with values 0,1,2, ...
-    dtype = np.int64 if n ** d > 2 ** 31 - OFFSET - 1 else np.int32
-    hc = np.arange(n ** d, dtype = dtype).reshape([n] * d)
-    lines = get_lines_enum_np(hc)
-    scopes = get_scopes_enum_np(lines, d)
-    if zeros:
-        hc.fill(0)
+    slices, template = _structure_template(d, n)
+    dtype = _cube_dtype(d, n, OFFSET)
+    hc = np.zeros([n] * d, dtype = dtype) if zeros else np.arange(n ** d, dtype = dtype).reshape([n] * d)
+    flat = hc.reshape(-1)
+    lines: Lines_enum_np = {idx: flat[s] for idx, s in enumerate(slices)}
+    scopes: Scopes_enum = DefaultDict(list)
+    for cell, ids in template:
+        scopes[cell] = list(ids)
     return (hc, lines, scopes)
 
 
@@ -888,14 +1608,14 @@ def connected_cells_np(lines: Lines_enum_np, scopes: Scopes_enum, d: int) -> Con
     >>> n = 3
     >>> struct = structure_enum_np(d, n, False) 
     >>> struct[1] #doctest: +NORMALIZE_WHITESPACE
-    {0: array([0, 3, 6]),
-     1: array([1, 4, 7]),
-     2: array([2, 5, 8]),
-     3: array([0, 1, 2]),
-     4: array([3, 4, 5]),
-     5: array([6, 7, 8]),
-     6: array([0, 4, 8]),
-     7: array([6, 4, 2])}
+    {0: array([0, 3, 6], dtype=int8),
+     1: array([1, 4, 7], dtype=int8),
+     2: array([2, 5, 8], dtype=int8),
+     3: array([0, 1, 2], dtype=int8),
+     4: array([3, 4, 5], dtype=int8),
+     5: array([6, 7, 8], dtype=int8),
+     6: array([0, 4, 8], dtype=int8),
+     7: array([6, 4, 2], dtype=int8)}
     
     >>> pprint(struct[2]) #doctest: +SKIP
     defaultdict(<class 'list'>,
@@ -959,15 +1679,15 @@ def connected_cells_np(lines: Lines_enum_np, scopes: Scopes_enum, d: int) -> Con
     """
 
     n = lines[0].size
-    shape = [n] * d
+    # the cell with flat index k is cells[k], so each cell tuple is made
+    # once rather than once for every time it appears in a line
+    cells = _cells(n, d)
     connected_cells: Connected_cells = DefaultDict(list)
 
     for cell, lines_enums in scopes.items():
-        for line_enum in lines_enums:
-                for j in range(n):
-                    cc = np.unravel_index(lines[line_enum][j], shape)
-                    connected_cells[cell].append(cc)
-        connected_cells[cell] = list(set(connected_cells[cell]))
+        flat = np.concatenate([lines[line_enum] for line_enum in lines_enums])
+        _check_flat_indices(flat, len(cells))
+        connected_cells[cell] = list(set(map(cells.__getitem__, flat.tolist())))
     return connected_cells
 
 
@@ -995,6 +1715,9 @@ def get_diagonals_coord(d: int, n: int) -> Generator[Line_coord, None, None]:
     The number of corners of h(d, n) is 2^d. The number of d-agonals 
     is 2^d / 2 since two connecting corners form a line. 
 
+    The diagonals are computed once for each (d, n) and cached. Each
+    call yields new lists, so these may be modified by the caller.
+
     Examples
     --------
     >>> diags = get_diagonals_coord(2, 3)
@@ -1002,29 +1725,37 @@ def get_diagonals_coord(d: int, n: int) -> Generator[Line_coord, None, None]:
     [[(0, 0), (1, 1), (2, 2)], [(0, 2), (1, 1), (2, 0)]]
     """    
     
+    # the diagonals are cached as tuples; yield a fresh list of each
+    for diagonal in _diagonals_coord(d, n):
+        yield list(diagonal)
+
+
+@lru_cache(maxsize = 32)
+def _diagonals_coord(d: int, n: int) -> Tuple[Tuple[Cell_coord, ...], ...]:
+    """ 
+    _diagonals_coord(d: int, n: int) -> Tuple[Tuple[Cell_coord, ...], ...]
+
+    Cached, immutable version of get_diagonals_coord.
+
+    Examples
+    --------
+    >>> _diagonals_coord(2, 3)
+    (((0, 0), (1, 1), (2, 2)), ((0, 2), (1, 1), (2, 0)))
+    """
+
     # comments below use an example with h(2, 3)
 
-    # get an iterator of all corners. E.g.: (0,0), (0,2), (2,0), (2,2)
-    corners_all = it.product([0, n - 1], repeat = d)
-    # restrict to corners with 0 as first coordinate. E.g.: (0,0), (0,2)
-    corners_0 = [corner for corner in corners_all if corner[0] == 0]
-    for corner in corners_0: 
-        # create the diagonals for each corner
-        diagonal: Line_coord = []
-        diagonal.append(corner) # add corner as first cell in diagonal
-        # add rest of diagonal
-        for i in range(1, n): 
-            # find next cell. Start by decrementing coords.
-            # E.g.: (0,0) -> (-1,-1); (0,2) -> (-1,1)
-            # E.g.: (0,0) -> (-2,-2); (0,2) -> (-2,0)
-            tmp = tuple(c - i for c in corner)
-            # Take absolute values of coords. 
-            # E.g.: (-1,-1) -> (1,1); (-1,1) -> (1,1)
-            # E.g.: (-2,-2) -> (2,2); (-2,0) -> (2,0) 
-            coords = tuple(abs(t) for t in tmp)
-            diagonal.append(coords)
-        
-        yield diagonal
+    # Each corner is given by a mask of which coordinates are n - 1.
+    # E.g.: (0,0) -> [0,0]; (0,2) -> [0,1]; (2,0) -> [1,0]; (2,2) -> [1,1]
+    # The first half are the corners with 0 as first coordinate.
+    masks = np.array(list(it.product([False, True], repeat = d)))[:2**(d - 1)]
+    # The i-th cell of the diagonal from a corner has coordinate i where
+    # the mask is 0 and n - 1 - i where it is 1.
+    # E.g.: [0,1] -> (0,2), (1,1), (2,0)
+    i = np.arange(n)[None, :, None]
+    diagonals = np.where(masks[:, None, :], n - 1 - i, i)
+
+    return tuple(tuple(map(tuple, diagonal)) for diagonal in diagonals.tolist())
 
 
 def get_lines_grouped_coord(d: int, n: int) -> Generator[Lines_coord, None, None]: 
@@ -1095,6 +1826,9 @@ def get_lines_i_coord(d: int, n: int, i: int) -> Generator[Lines_coord, None, No
     sketch of a constructive proof for the number of lines in a 
     hypercube. This has been used to implement this function. 
 
+    The lines are computed once for each (d, n, i) and cached. Each
+    call yields new lists, so these may be modified by the caller.
+
     Examples
     --------
     >>> lines = list(get_lines_grouped_coord(2, 2))
@@ -1103,23 +1837,29 @@ def get_lines_i_coord(d: int, n: int, i: int) -> Generator[Lines_coord, None, No
      [(1, 0), (1, 1)]], [[(0, 0), (1, 1)], [(0, 1), (1, 0)]]]
     """
     
-    lines = []
+    # the lines are cached as tuples; yield a fresh list of lists
+    yield [list(line) for line in _lines_i_coord(d, n, i)]
 
-    diagonals = list(get_diagonals_coord(i + 1, n))
-    # loop over all possible combinations of i dimensions
-    for i_comb in it.combinations(range(d), r = i + 1): 
-        # a cell could be in any position in the other dimensions
-        other_d = set(range(d)) - set(i_comb)
-        for cell in it.product(range(n), repeat = d - i - 1):                                  
-            diags: Lines_coord = []
-            for diagonal in diagonals:
-                diag = []
-                for c in diagonal:
-                    diag.append(insert_into_tuple(c, other_d, cell))
-                diags.append(diag)
-            lines.extend(diags)
-    
-    yield lines
+
+@lru_cache(maxsize = 32)
+def _lines_i_coord(d: int, n: int, i: int) -> Tuple[Tuple[Cell_coord, ...], ...]:
+    """ 
+    _lines_i_coord(d: int, n: int, i: int) -> Tuple[Tuple[Cell_coord, ...], ...]
+
+    Cached, immutable version of get_lines_i_coord.
+
+    Examples
+    --------
+    >>> _lines_i_coord(2, 2, 1)
+    (((0, 0), (1, 1)), ((0, 1), (1, 0)))
+    """
+
+    # the flat index of each cell, computed for all lines at once
+    flat = _lines_i_array_coord(d, n, i) @ (n ** np.arange(d - 1, -1, -1))
+    # every line through a cell shares the same tuple for that cell
+    cell = _cells(n, d).__getitem__
+
+    return tuple(tuple(map(cell, line)) for line in flat.tolist())
 
 
 def get_lines_coord(d: int, n: int) -> Generator[Line_coord, None, None]: 
@@ -1156,8 +1896,84 @@ def get_lines_coord(d: int, n: int) -> Generator[Line_coord, None, None]:
     """
     
     grouped = get_lines_grouped_coord(d, n)
-    flat = (x for y in grouped for x in y)
-    yield from flat # return flat works as well but yield from this is explicit as to being a generator
+    yield from it.chain.from_iterable(grouped)
+
+
+def get_lines_array_coord(d: int, n: int) -> Lines_array_coord:
+    """ 
+    get_lines_array_coord(d: int, n: int) -> Lines_array_coord:
+    
+    Returns the coordinates of the lines in a hypercube as a single 
+    3-d array
+
+    Parameters
+    ----------
+    d
+        The number of dimensions of the hypercube
+    n
+        The number of cells in any dimension
+
+    Returns
+    -------
+
+        A numpy.ndarray of dtype np.int32 and shape 
+        (number of lines, n, d) holding the coordinates of the cells 
+        of each line in h(d, n), in the same order as get_lines_coord.
+                
+    See Also
+    --------
+    get_lines_coord
+
+    Notes
+    -----
+    For each number of dimensions spanned, the cells of a block of 
+    lines are written with two assignments: the diagonal coordinates 
+    into the spanned dimensions and the fixed coordinates into the 
+    others. This avoids building a tuple for every cell.
+
+    Examples
+    --------
+    >>> lines = get_lines_array_coord(2, 2)
+    >>> lines.shape
+    (6, 2, 2)
+    >>> lines[4:].tolist()
+    [[[0, 0], [1, 1]], [[0, 1], [1, 0]]]
+    >>> [[tuple(c) for c in line] for line in lines.tolist()] == list(get_lines_coord(2, 2))
+    True
+    """
+
+    return np.concatenate([_lines_i_array_coord(d, n, i) for i in range(d)])
+
+
+def _lines_i_array_coord(d: int, n: int, i: int) -> Lines_array_coord:
+    """ 
+    _lines_i_array_coord(d: int, n: int, i: int) -> Lines_array_coord
+
+    The coordinates of the lines in h(d, n) that span i + 1 dimensions,
+    as an array of shape (number of lines, n, d), in the same order as
+    get_lines_i_coord.
+
+    Examples
+    --------
+    >>> _lines_i_array_coord(2, 2, 1).tolist()
+    [[[0, 0], [1, 1]], [[0, 1], [1, 0]]]
+    """
+
+    # diagonals spanning i + 1 dimensions, shape (2^i, n, i + 1)
+    diagonals = np.array(_diagonals_coord(i + 1, n), dtype = np.int32)
+    # all positions in the other dimensions, shape (n^(d-i-1), d-i-1)
+    cells = np.array(_cells(n, d - i - 1), dtype = np.int32).reshape(n ** (d - i - 1), d - i - 1)
+    combs = _combinations(d, i + 1)
+
+    # for each combination, a block of lines for every cell and diagonal
+    # is written with two assignments: the diagonal coordinates into the
+    # spanned dimensions and the cell coordinates into the others
+    lines = np.empty((len(combs), len(cells), len(diagonals), n, d), dtype = np.int32)
+    for block, (i_comb, other_d) in zip(lines, combs):
+        block[..., i_comb] = diagonals
+        block[..., other_d] = cells[:, None, None, :]
+
+    return lines.reshape(-1, n, d)
 
 
 def get_scopes_coord(lines: Lines_coord, d: int) -> Scopes_coord:
@@ -1216,13 +2032,17 @@ def get_scopes_coord(lines: Lines_coord, d: int) -> Scopes_coord:
 
     n = len(lines[0])
     scopes: Scopes_coord = DefaultDict(list)
-    cells = it.product(range(n), repeat = d) # get all possible cells
 
-    for cell in cells:
-        for line in lines:
-            if cell in line:
-                scopes[cell].append(line)
-    return scopes
+    # each line belongs to the scope of every cell in it
+    for line in lines:
+        for cell in line:
+            scopes[cell].append(line)
+
+    # key the scopes in cell order, as if each cell had been visited in
+    # turn, leaving out cells that are in none of the lines
+    ordered: Scopes_coord = DefaultDict(list, ((cell, scopes[cell]) for cell in _cells(n, d) if cell in scopes))
+    ordered.update(scopes)
+    return ordered
 
 
 def structure_coord(d: int, n: int) -> Structure_coord:
@@ -1374,13 +2194,17 @@ def get_scopes_enum_coord(lines: Lines_enum_coord, d: int) -> Scopes_enum:
 
     n = len(lines[0])
     scopes: Scopes_enum = DefaultDict(list)
-    cells = it.product(range(n), repeat = d) # get all possible cells
 
-    for cell in cells:
-        for idx, line in lines.items():
-            if cell in line:
-                scopes[cell].append(idx)
-    return scopes
+    # each line belongs to the scope of every cell in it
+    for idx, line in lines.items():
+        for cell in line:
+            scopes[cell].append(idx)
+
+    # key the scopes in cell order, as if each cell had been visited in
+    # turn, leaving out cells that are in none of the lines
+    ordered: Scopes_enum = DefaultDict(list, ((cell, scopes[cell]) for cell in _cells(n, d) if cell in scopes))
+    ordered.update(scopes)
+    return ordered
 
 
 def structure_enum_coord(d: int, n: int) -> Structure_enum_coord:
@@ -1588,38 +2412,37 @@ def get_scope_cell_coord(d: int, n: int, cell: Cell_coord) -> Generator[Line_coo
      [(1, 0, 3), (1, 1, 3), (1, 2, 3), (1, 3, 3)], 
      [(1, 2, 0), (1, 2, 1), (1, 2, 2), (1, 2, 3)], 
      [(0, 3, 3), (1, 2, 3), (2, 1, 3), (3, 0, 3)]]
+    >>> list(get_scope_cell_coord(d, n, (1,2,4)))
+    []
     """
 
+    # a cell that is not on the board is in no lines
+    if not all(0 <= c < n for c in cell):
+        return
+
     # loop over the numbers of dimensions
     for i in range(d): 
         # for each combination of i dimensions
         for i_comb in it.combinations(range(d), r = i + 1): 
-            # increment call coordinates along all potential lines
-            incr = it.product([-1, 1], repeat = i + 1) 
-            seen: Line_coord = []
-            for j in incr:
-                
-                # store potential lines. Could use a list but deque
-                # makes it clear we are moving "up and down" the line
-                d_line: Deque[Cell_coord] = Deque((cell,))
-                
-                # since we are moving "up and down" we don't need
-                # to move "down and up" as well
-                j_neg = tuple(-x for x in list(j))
-                if j_neg not in seen:
-                    seen.append(j)
-
-                    for k in range(1, n):
-                        jk = tuple(x * k for x in list(j)) # size of increments
-                        # record cells positions of increments
-                        d_line.appendleft(increment_cell_coord(cell, i_comb, jk))
-                        d_line.append(increment_cell_coord(cell, i_comb, jk, False))                        
-                
-                    # some calculated cells will simply not be part of the board
-                    line = remove_invalid_cells_coord(n, list(d_line))
-                    # we only want lines that are winning lines
-                    if len(line) == n:
-                        yield line
+            # the position of the cell along any line through it is its
+            # coordinate in the first dimension of the combination
+            k0 = cell[i_comb[0]]
+            # a line is the same whichever end it starts from, so only
+            # the directions increasing in the first dimension are needed.
+            # Along the line, each other dimension either increases (-1)
+            # or decreases (1)
+            for j in it.product([-1, 1], repeat = i):
+                # the cell is on a winning line only if it is at the same 
+                # position along the line in every dimension
+                if all(cell[c] == (k0 if s < 0 else n - 1 - k0) for c, s in zip(i_comb[1:], j)):
+                    line: Line_coord = []
+                    for k in range(n):
+                        c = list(cell)
+                        c[i_comb[0]] = k
+                        for dim, s in zip(i_comb[1:], j):
+                            c[dim] = k if s < 0 else n - 1 - k
+                        line.append(tuple(c))
+                    yield line
 
 
 def scopes_size(scopes: Scopes) -> Counter:
@@ -1660,7 +2483,7 @@ def scopes_size(scopes: Scopes) -> Counter:
     True
     """
     
-    return Counter([len(scope) for scope in scopes.values()])
+    return Counter(map(len, scopes.values()))
 
 
 def scopes_size_cell(scopes: Scopes) -> DefaultDict[int, List[Cell_coord]]:
@@ -1751,10 +2574,11 @@ def scopes_size_cell(scopes: Scopes) -> DefaultDict[int, List[Cell_coord]]:
 # The following 3 functions are for the displaying of a hypercube to a terminal. 
 # It is assumed that an numpy ndarray has been used to represent the hypercube
 
-def display_np(hc: Cube_np, display_cell: Callable[[Any], Tuple[str, str, str]] = None, ul = False) -> str:
+def display_np(hc: Cube_np, display_cell: Optional[Callable[[Any], Tuple[str, str, str]]] = None, 
+               ul: bool = False) -> str:
     """ 
-    display_np(hc: Cube_np, display_cell: Callable[[Any], 
-               Tuple[str, str, str]] = None, ul = False) -> 
+    display_np(hc: Cube_np, display_cell: Optional[Callable[[Any], 
+               Tuple[str, str, str]]] = None, ul: bool = False) -> 
         str:
     
     Construct a string to display the hypercube in the terminal.
@@ -1844,13 +2668,12 @@ def display_np(hc: Cube_np, display_cell: Callable[[Any], Tuple[str, str, str]]
 
     # hc is not a single cell
     d = hc.ndim
-    # break the array into sub arrays along the first dimension
-    sub_hc = [hc[i] for i in range(hc.shape[0])]
+    last = hc.shape[0] - 1
 
-    # constuct a string for each sub array
+    # constuct a string for each sub array along the first dimension
     sub_hc_str = []
-    for c, a in enumerate(sub_hc):
-        if d == 2 and c == len(sub_hc) - 1:
+    for c, a in enumerate(hc):
+        if d == 2 and c == last:
             # sub arr is 2-dimensional and last row - don't underline
             ul = False
         elif d != 1:
@@ -1859,22 +2682,41 @@ def display_np(hc: Cube_np, display_cell: Callable[[Any], Tuple[str, str, str]]
         sub_hc_str.append(display_np(a, display_cell, ul))
 
     # join the sub strings
-    if d % 2 == 0: # even number of dimensions - display down the screen
-        if d == 2:
-            return ''.join('\n'.join(sub_hc_str))
-        else:
-            sp = '\n' + '\n' * (int((d / 2) ** 1.5) - 1) # increase space between higher dimesions  
-            return sp.join(sub_hc_str)
+    if d % 2 == 0 or d == 1: # even dimensions display down the screen; cells in a row by "|"
+        return _display_separator(d).join(sub_hc_str)
     else: # odd number of dimensions - display across the screen
-        if d == 1:
-            return '|'.join(sub_hc_str)
-        else:
-            return join_multiline(sub_hc_str, ' ' + ' ' * int((d - 2) ** 1.5) + ' ', False)
+        return join_multiline(sub_hc_str, _display_separator(d), False)
+
+
+@lru_cache(maxsize = 32)
+def _display_separator(d: int) -> str:
+    """ 
+    _display_separator(d: int) -> str
+
+    The separator between the displayed sub arrays of a d-dimensional
+    array. See display_np.
+
+    Examples
+    --------
+    >>> _display_separator(1), _display_separator(2), _display_separator(4)
+    ('|', '\\n', '\\n\\n')
+    >>> _display_separator(3)
+    '   '
+    """
+
+    if d == 1:
+        return '|'
+    elif d == 2:
+        return '\n'
+    elif d % 2 == 0: # even number of dimensions - display down the screen
+        return '\n' + '\n' * (int((d / 2) ** 1.5) - 1) # increase space between higher dimesions  
+    else: # odd number of dimensions - display across the screen
+        return ' ' + ' ' * int((d - 2) ** 1.5) + ' '
 
 
-def underline(s: str, alpha_only = True) -> str:
+def underline(s: Any, alpha_only: bool = True) -> str:
     """ 
-    underline(s: str, alpha_only = True) -> str
+    underline(s: Any, alpha_only: bool = True) -> str
     
     Underlines a string.
 
@@ -1891,6 +2733,7 @@ def underline(s: str, alpha_only = True) -> str:
     Notes
     -----
     The code appears only to work properly with alphabetic characters.
+    Results for strings of up to 256 characters are cached.
 
     Examples
     --------
@@ -1904,26 +2747,57 @@ def underline(s: str, alpha_only = True) -> str:
     '1̲'
     """
 
-    try:
-        if alpha_only:
-            s_ = ""
-            for chr in str(s):
-                if chr.isalpha():
-                    s_ = s_ +  chr + "\u0332"
-                else:
-                    s_ = s_ + chr
-            return s_
-        else:
-            return ''.join([chr + "\u0332" for chr in str(s)])      
-    except:
-        return s
+    s = str(s)
+    # the same few strings (typically player marks) are underlined
+    # repeatedly, so short strings are cached
+    if len(s) > _UNDERLINE_CACHE_MAX_LEN:
+        return _underline(s, alpha_only)
+    else:
+        return _underline_cached(s, alpha_only)
+
+
+def _underline(s: str, alpha_only: bool) -> str:
+    """ 
+    _underline(s: str, alpha_only: bool) -> str
+
+    Underlines a string. See underline.
+    """
+
+    ul = _COMBINING_LOW_LINE
+    if alpha_only:
+        return s.translate(_UNDERLINE_ALPHA_TABLE)
+    else:
+        # joining on the combining low line places it after every
+        # character but the last, so it only needs appending once
+        return ul.join(s) + ul if s else s
+
+
+class _UnderlineAlphaTable(dict):
+    """ 
+    Translation table for str.translate that maps each alphabetic 
+    character to itself followed by a combining low line, and every
+    other character to itself. Entries are added as characters are
+    first seen, so isalpha is called once per distinct character.
+    """
+
+    def __missing__(self, key: int) -> Union[str, int]:
+        c = chr(key)
+        value: Union[str, int] = c + _COMBINING_LOW_LINE if c.isalpha() else key
+        self[key] = value
+        return value
+
 
+_COMBINING_LOW_LINE = "\u0332"
+_UNDERLINE_ALPHA_TABLE = _UnderlineAlphaTable()
+_UNDERLINE_CACHE_MAX_LEN = 256
+_underline_cached = lru_cache(maxsize = 1024)(_underline)
 
-def join_multiline(iter: Iterable[str], divider: str = ' ', divide_empty_lines: bool = False,
+
+def join_multiline(iter: Iterable[Union[str, Sequence[str]]], divider: str = ' ', divide_empty_lines: bool = False,
                    fill_value: str = '_') -> str:
     """ 
-    join_multiline(iter: Iterable[str], divider: str = ' ', 
-                   divide_empty_lines: bool = False, 
+    join_multiline(iter: Iterable[Union[str, Sequence[str]]], 
+                   divider: str = ' ', divide_empty_lines: bool = False, 
                    fill_value: str = '_') -> str
     
     Join multiline string line by line.
@@ -1931,7 +2805,9 @@ def join_multiline(iter: Iterable[str], divider: str = ' ', divide_empty_lines:
     Parameters
     ----------
     iter
-        An iterable of multiline (or single line) strings 
+        An iterable of multiline (or single line) strings. A block
+        may also be given as a sequence of its lines, in which case
+        it is not split again.
     divider
         String to divide the corresponding lines in each iterable
     divide_empty_lines
@@ -1984,26 +2860,37 @@ def join_multiline(iter: Iterable[str], divider: str = ' ', divide_empty_lines:
     AA_BB_CC
     __
     MM_NN_ZZ
+    >>> ml = join_multiline([['AA', 'MM'], 'BB\\nNN'])
+    >>> print(ml) #doctest: +NORMALIZE_WHITESPACE
+    AA BB
+    MM NN
     """
     
-    # for each multiline block, split into individual lines
-    spl = [x.split('\n') for x in iter]
-    
-    # create list of tuples with tuple i containing line i from each multiline block
-    tl = [i for i in it.zip_longest(*spl, fillvalue = fill_value)]
-        
-    if divide_empty_lines:
-        st = [divider.join(t) for t in tl]
-    else:
-        st = []
-        for t in tl:
-            if all([not x.strip() for x in t]):
-                st.append('')
-            else:
-                st.append(divider.join(t))
-
-    # finally, join each string separated by a new line 
-    return '\n'.join(st)            
+    # bind the methods called for every block and line to local names
+    split = str.split
+    join = divider.join
+    concat = ''.join
+
+    # for each multiline block, split into individual lines. Blocks
+    # that have already been split into lines are used as they are.
+    # iter is consumed exactly once, into a tuple as it is not modified.
+    spl = tuple(split(x, '\n') if isinstance(x, str) else x for x in iter)
+
+    if len(spl) == 2:
+        # joining a pair of blocks is common enough to avoid unpacking
+        # spl into zip_longest and joining a tuple for every line
+        return '\n'.join([('' if not divide_empty_lines and not (a + b).strip() 
+                           else a + divider + b)
+                          for a, b in it.zip_longest(spl[0], spl[1], fillvalue = fill_value)])
+
+    # join the tuples containing line i from each multiline block with
+    # divider. A list (rather than a generator) is passed to the final
+    # join, as str.join makes a list from its argument anyway.
+    # The lines in a tuple are all blank exactly when their concatenation
+    # is, which is tested with one C-level strip rather than a generator
+    # over the tuple.
+    return '\n'.join([('' if not divide_empty_lines and not concat(t).strip() else join(t))
+                      for t in it.zip_longest(*spl, fillvalue = fill_value)])
 ####################################################################################################
 
 
@@ -2052,14 +2939,24 @@ def slice_ndarray(arr: Cube_np, dims: Collection[int], coords: Collection[int])
            [2, 3]])
     >>> slice_ndarray(arr, (1, 2), (0, 0))
     array([0, 4])
+    >>> slice_ndarray(arr, (2,), (1,))
+    array([[1, 3],
+           [5, 7]])
     """
 
-    # create a list of slice objects, one for each dimension of the array
-    # Note: slice(None) is the same as ":". E.g. arr[:, 4] = arr[slice(none), 4)]
-    sl: List[Union[slice, int]] = [slice(None)] * arr.ndim    
     if len(dims) != len(coords):
         raise ValueError("dims and coords must be of the same length")
-    
+
+    if len(dims) == 1:
+        # slicing a single dimension is the common case: index with the
+        # full slices before it and the coordinate, which is still a view
+        # Note: slice(None) is the same as ":". E.g. arr[:, 4] = arr[slice(none), 4)]
+        dim, = dims
+        coord, = coords
+        return arr[(slice(None),) * range(arr.ndim)[dim] + (coord,)]
+
+    # create a list of slice objects, one for each dimension of the array
+    sl: List[Union[slice, int]] = [slice(None)] * arr.ndim    
     for dim, coord in zip(dims, coords):
         sl[dim] = coord
     
@@ -2104,22 +3001,38 @@ def insert_into_tuple(tup: Tuple, pos: Union[int, Collection[int]], val: Any) ->
     (0, 1, 2, 3)
     """
     
-    tl = list(tup)
-
     if isinstance(pos, int):
-        tl.insert(pos, val)
-    else:
-        if len(pos) != len(val):
-            raise ValueError("pos and val must be of the same length")
+        # slicing clamps pos in the same way as list.insert
+        return tup[:pos] + (val,) + tup[pos:]
+
+    if len(pos) != len(val):
+        raise ValueError("pos and val must be of the same length")
 
-        if len(pos) == 0:
-            return tup
+    if len(pos) == 0:
+        return tup
 
-        # sort pos so from low to high; sort val correspondingly
-        stl = list(zip(*sorted(zip(pos, val))))
-        for p, v in zip(stl[0], stl[1]):
-            tl.insert(p, v)
+    # sort pos so from low to high; sort val correspondingly
+    pairs = sorted(zip(pos, val))
+
+    # merge the values into the tuple, copying each run of the tuple 
+    # between consecutive positions in one go
+    out: List[Any] = []
+    src = 0
+    for p, v in pairs:
+        run = p - len(out)
+        if run < 0:
+            break
+        out.extend(tup[src:src + run])
+        src += run
+        out.append(v)
+    else:
+        out.extend(tup[src:])
+        return tuple(out)
 
+    # negative or repeated positions depend on the order of insertion
+    tl = list(tup)
+    for p, v in pairs:
+        tl.insert(p, v)
     return tuple(tl)
 
 
@@ -2249,26 +3162,29 @@ def str_to_tuple(d: int, n: int, cell: str, offset: int = 1) -> Cell_coord:
 
     cell = str(cell)
     # check to see if there are any non-digits
-    nd = re.findall(r'\D+', cell) 
-    if len(nd) == 0: 
+    if _NON_DIGITS_RE.search(cell) is None: 
         if n > 9:
             raise ValueError("Board is too big for each dimension to be specified by single digit")
         else:
             tup = tuple(int(coord) - offset for coord in cell) 
     else: # there are non-digits, use these as separators
-        tup = tuple(int(coord) - offset for coord in re.findall(r'\d+', cell)) 
+        tup = tuple(int(coord) - offset for coord in _DIGITS_RE.findall(cell)) 
     
     # check that correct number of coordinates specified
     if len(tup) != d:
         raise ValueError("Incorrect number of coordinates provided")
 
     # check that each coordinate is valid
-    if all(t in range(n) for t in tup):
+    if all(0 <= t < n for t in tup):
         return tup
     else:
         raise ValueError("One or more coordinates are not valid")           
 
 
+_NON_DIGITS_RE = re.compile(r'\D+')
+_DIGITS_RE = re.compile(r'\d+')
+
+
 def remove_invalid_cells_coord(n:int, line: Line_coord) -> Line_coord:
     """ 
     remove_invalid_cells_coord(n:int, line: Line_coord) -> Line_coord
@@ -2335,14 +3251,50 @@ def _lines_np_coord_check(d: int, n: int) -> bool:
     This function is a private function used in testing.
     """
 
-    dtype = np.int64 if n ** d > 2 ** 31 else np.int32
+    # the smallest unsigned integer type holding every flat index, so
+    # that the lines take as little memory as possible to sort
+    dtype = np.min_scalar_type(n ** d - 1)
     arr = np.arange(n ** d, dtype = dtype).reshape([n] * d)
 
-    lines_np = get_lines_np(arr)
-    lines_coord = get_lines_coord(d, n)
+    # the flat indices of the cells of each line, one row per line
+    lines_np = get_lines_array_np(arr)
+    # arr holds the flat index of each cell, so the coordinate lines 
+    # are the flat indices of their cells
+    lines_coord = _coord_flat_indices(d, n).astype(dtype)
 
-    t_np = [tuple(sorted(l.tolist())) for l in lines_np] # type: ignore
-    t_coord = [tuple(sorted([arr[c] for c in l])) for l in lines_coord] 
+    # a line is the same whichever end it starts from, so sort each row;
+    # then sort the rows, so that the lines (including any repeats) can 
+    # be compared without leaving numpy
+    def rows(lines: Lines_array_np) -> Lines_array_np:
+        lines = np.sort(lines, axis = 1)
+        return lines[np.lexsort(lines.T[::-1])]
 
-    return set(t_np) == set(t_coord)
+    return bool(np.array_equal(rows(lines_np), rows(lines_coord)))
     
+
+
+@lru_cache(maxsize = 8)
+def _coord_flat_indices(d: int, n: int) -> Lines_array_np:
+    """ 
+    _coord_flat_indices(d: int, n: int) -> Lines_array_np
+
+    The flat indices of the cells of the lines from get_lines_coord,
+    one row per line. The returned array is cached and read-only.
+
+    Examples
+    --------
+    >>> _coord_flat_indices(2, 2)
+    array([[0, 2],
+           [1, 3],
+           [0, 1],
+           [2, 3],
+           [0, 3],
+           [1, 2]])
+    """
+
+    # the flat index is the dot product of the coordinates with the
+    # strides of h(d, n) counted in elements
+    strides = n ** np.arange(d - 1, -1, -1)
+    lines = get_lines_array_coord(d, n) @ strides
+    lines.setflags(write = False)
+    return lines
@@ -1,3 +1,4 @@
+import numpy as np # type: ignore
 from numpy import unravel_index
 from itertools import groupby
 from sys import getsizeof
@@ -91,6 +92,11 @@ class TicTacToe():
             print("The board is too big to fit into available memory")
             raise
 
+        # the board is populated with 0,1,2,... at this point, so the lines hold
+        # the flat indices of their cells. Keep these as a (num_lines, n) array
+        # so that many lines can be gathered from the board in one operation
+        self._line_idx = np.array([self.lines[k] for k in range(len(self.lines))])
+
         self.d = d
         self.n = n
         self.shape = [n] * d
@@ -248,13 +254,14 @@ class TicTacToe():
         print(b)
 
 
-    def move(self, cell: Union[str, Cell_coord], offset: int = 1) -> None:
+    def move(self, cell: Union[str, Cell_coord, int], offset: int = 1) -> None:
         """ Player makes a move.
 
         Parameters
         ----------
-        cell: str or tuple
-            The cell being played
+        cell: str, tuple or int
+            The cell being played. An int is taken to be the index of
+            the cell in the flattened board.
         offset: int, optional
             For a cell specified as a string, what is first dimension.
             Defaults to 1; typically 0 would be the other choice 
@@ -277,6 +284,14 @@ class TicTacToe():
         try:
             if isinstance(cell, str):
                 t_cell = hc.str_to_tuple(self.d, self.n, cell, offset)
+            elif isinstance(cell, tuple):
+                t_cell = cell
+            elif isinstance(cell, bool):
+                # a bool is an int, but is not a cell
+                raise TypeError("A bool is not a cell")
+            elif isinstance(cell, (int, np.integer)):
+                # flat index of the cell
+                t_cell = tuple(int(c) for c in unravel_index(cell, self.shape))
             else:
                 t_cell = tuple(cell)
             
@@ -291,7 +306,7 @@ class TicTacToe():
 
         # we now have an empty cell
         self.moves_played[self.active_player] += 1
-        sgn = -1 if self.active_player == 1 else 1 # player 0 is positive, player 1 negative
+        sgn = 1 - 2 * self.active_player # player 0 is positive, player 1 negative
         self.board[t_cell] = sgn * (self.moves_played[self.active_player] + self._MOVE_BASE)
         
         # add to list of moves played and remove from unplayed list
@@ -313,7 +328,7 @@ class TicTacToe():
         self.active_moves += 1
         if self.active_moves == self.moves_per_turn:
             self.active_moves = 0
-            self.active_player = int(not self.active_player)
+            self.active_player ^= 1
 
         # update lines states
         if self.maintain_lines_states:
@@ -339,11 +354,17 @@ class TicTacToe():
                 # not enough moves played for a winner to be possible
                 return False
             else:
-                for line_enum in self.scopes[cell]:
-                    line = self.lines[line_enum]
-                    if sum(line > self._MOVE_BASE) == self.n or sum(line < -self._MOVE_BASE) == self.n:
-                        self.win_line = line
-                        return True
+                # gather the values of all lines in the scope of the cell at once
+                scope = self.scopes[cell]
+                vals = self.board.ravel()[self._line_idx[scope]]
+                # played cells are clipped to +/-(_MOVE_BASE + 1) and all other cells lie
+                # strictly between these, so a line is won only if the magnitude of its
+                # sum is n * (_MOVE_BASE + 1). Both players are checked in a single pass.
+                top = self._MOVE_BASE + 1
+                won = np.abs(np.clip(vals, -top, top).sum(1)) == self.n * top
+                if won.any():
+                    self.win_line = self.lines[scope[np.argmax(won)]]
+                    return True
                 return False
 
     def undo(self, replace: int = 0) -> None:
@@ -359,6 +380,12 @@ class TicTacToe():
         -------
         None
 
+        Raises
+        ------
+        ValueError
+            If `replace` does not fit in the dtype of the board, which
+            is the smallest integer type that holds the marks of moves.
+
         Examples
         --------
         >>> ttt = TicTacToe(2, 3)
@@ -380,6 +407,12 @@ class TicTacToe():
         [(0, (1, 1)), (1, (0, 0))]
         """
 
+        # check before changing any state, as numpy raises OverflowError
+        # on assigning an out of range value to the board
+        info = np.iinfo(self.board.dtype)
+        if not info.min <= replace <= info.max:
+            raise ValueError(f"replace must be between {info.min} and {info.max}")
+
         self.state = GameState.IN_PROGRESS
 
         if self.forfeited:
@@ -391,7 +424,7 @@ class TicTacToe():
         
         if self.active_moves == 0:
             self.active_moves = self.moves_per_turn - 1
-            self.active_player = int(not self.active_player)
+            self.active_player ^= 1
         else:
             self.active_moves -= 1
 